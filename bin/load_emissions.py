@@ -7,12 +7,21 @@ import os
 import argparse
 import hashlib
 import sys
+import uuid
 from datetime import datetime
-from collections import defaultdict
-from typing import Dict, List, Any, Tuple
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from collections import Counter, defaultdict
+from itertools import groupby, islice
+from operator import itemgetter
+from typing import Dict, Iterable, Iterator, List, Any, Optional, Tuple
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, as_completed, wait
 import threading
 from dotenv import load_dotenv
+from requests.adapters import HTTPAdapter
+
+try:
+    import orjson
+except ImportError:  # orjson is optional; fall back to the stdlib encoder
+    orjson = None
 
 # Load environment variables from .env file
 load_dotenv()
@@ -24,6 +33,7 @@ DEBUG_MODE = os.getenv("DEBUG_MODE", "false").lower() == "true"
 BATCH_SIZE = int(os.getenv("BATCH_SIZE", "250"))
 MAX_THREADS = int(os.getenv("MAX_THREADS", "6"))
 SSL_VERIFY = os.getenv("SSL_VERIFY", "false").lower() != "false"
+FAILED_BATCH_DIR = os.getenv("FAILED_BATCH_DIR", "failed_batches")
 
 # Disable SSL warnings if verification is disabled
 if not SSL_VERIFY:
@@ -31,9 +41,44 @@ if not SSL_VERIFY:
     urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
     print("⚠️  WARNING: SSL certificate verification is DISABLED")
 
+# Shared session so worker threads reuse keep-alive connections instead of
+# opening a new TCP/TLS connection for every batch
+SESSION = requests.Session()
+
+
+def configure_session(pool_size: int) -> None:
+    """Size the shared session's connection pool to the number of worker threads."""
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    SESSION.mount("https://", adapter)
+    SESSION.mount("http://", adapter)
+
+
+def encode_json(payload: Any) -> bytes:
+    """Serialize a payload to compact JSON bytes, using orjson when it is installed."""
+    if orjson is not None:
+        return orjson.dumps(payload)
+    return json.dumps(payload, separators=(",", ":")).encode("utf-8")
+
+
+def pretty_json(payload: Any) -> str:
+    """Format a payload as indented JSON for debug and error output."""
+    if orjson is not None:
+        return orjson.dumps(payload, option=orjson.OPT_INDENT_2).decode("utf-8")
+    return json.dumps(payload, indent=2)
+
+
+# Zero-padded forms of month/day strings as they appear in the CSV ("1" or "01" -> "01")
+PAD2 = {key: f"{i:02d}" for i in range(32) for key in (str(i), f"{i:02d}")}
+
 
 def create_date_string(year: str, month: str, day: str) -> str:
     """Combine year, month, day into ISO 8601 date string."""
+    # Fast path: look up the padded month/day instead of str/strip/zfill on every call
+    padded_month = PAD2.get(month)
+    padded_day = PAD2.get(day)
+    if padded_month is not None and padded_day is not None:
+        return f"{year}-{padded_month}-{padded_day}"
+    
     try:
         # Handle string inputs and pad with zeros if needed
         year = str(year).strip()
@@ -44,14 +89,20 @@ def create_date_string(year: str, month: str, day: str) -> str:
         raise ValueError(f"Invalid date values: year={year}, month={month}, day={day}") from e
 
 
-def generate_external_id(key: str, emission_type: str, date: str) -> str:
+def external_id_prefix(key: str):
+    """Return a SHA-256 context primed with the key, for reuse across generate_external_id calls."""
+    return hashlib.sha256(f"{key}_".encode('utf-8'))
+
+
+def generate_external_id(key: str, emission_type: str, date: str, prefix=None) -> str:
     """Generate a 12-byte hash-based external ID from key, emission type, and date.
     Uses first 12 bytes (24 hex characters) of SHA-256 hash for uniqueness.
+    Pass a context from external_id_prefix(key) to avoid rehashing the key for every ID.
     """
-    combined = f"{key}_{emission_type}_{date}"
-    hash_obj = hashlib.sha256(combined.encode('utf-8'))
+    hash_obj = prefix.copy() if prefix is not None else external_id_prefix(key)
+    hash_obj.update(f"{emission_type}_{date}".encode('utf-8'))
     # Return first 12 bytes (24 hex characters) for a shorter, unique ID
-    return hash_obj.hexdigest()[:24]
+    return hash_obj.digest()[:12].hex()
 
 
 def convert_properties_to_array(properties: Dict[str, Any]) -> List[Dict[str, Any]]:
@@ -74,6 +125,15 @@ def convert_properties_to_array(properties: Dict[str, Any]) -> List[Dict[str, An
     return props_array
 
 
+def write_failed_payload(batch_type: str, body: bytes) -> str:
+    """Write a failed batch's JSON body to a uniquely named file in FAILED_BATCH_DIR and return its path."""
+    os.makedirs(FAILED_BATCH_DIR, exist_ok=True)
+    file_path = os.path.join(FAILED_BATCH_DIR, f"failed_{batch_type}_batch_{uuid.uuid4().hex}.json")
+    with open(file_path, 'wb') as f:
+        f.write(body)
+    return file_path
+
+
 def create_nodes_batch(token: str, nodes: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
     """Create multiple nodes in a batch using the IndyKite capture API."""
     url = f"{INDYKITE_HOST}/capture/v1/nodes"
@@ -88,22 +148,25 @@ def create_nodes_batch(token: str, nodes: List[Dict[str, Any]]) -> List[Dict[str
         "nodes": nodes
     }
     
-    print("\n" + "="*80)
-    print("FULL POST REQUEST DETAILS - NODES")
-    print("="*80)
-    print(f"URL: {url}")
-    print(f"\nHeaders:")
-    print(json.dumps(headers, indent=2))
-    print(f"\nPayload (Full - {len(nodes)} nodes):")
-    print(json.dumps(payload, indent=2))
-    print("="*80 + "\n")
-    
     if DEBUG_MODE:
+        # Pretty-printing the full payload is expensive, so only do it in debug mode
+        print("\n" + "="*80)
+        print("FULL POST REQUEST DETAILS - NODES")
+        print("="*80)
+        print(f"URL: {url}")
+        print(f"\nHeaders:")
+        print(pretty_json(headers))
+        print(f"\nPayload (Full - {len(nodes)} nodes):")
+        print(pretty_json(payload))
+        print("="*80 + "\n")
         print("    [DEBUG MODE] Skipping actual POST request")
         return {"status": "debug", "nodes_processed": len(nodes)}
     
+    print(f"    POST {url} ({len(nodes)} nodes)")
+    
+    body = encode_json(payload)
     try:
-        response = requests.post(url, headers=headers, json=payload, verify=SSL_VERIFY)
+        response = SESSION.post(url, headers=headers, data=body, verify=SSL_VERIFY)
         print(f"    Response status: {response.status_code}")
         
         if response.status_code != 200 and response.status_code != 201:
@@ -115,16 +178,9 @@ def create_nodes_batch(token: str, nodes: List[Dict[str, Any]]) -> List[Dict[str
         return result
     except Exception as e:
         print(f"    Error: {e}")
-        # Write failed payload to STDERR
-        print(f"    Failed payload written to STDERR", file=sys.stderr)
-        print("="*80, file=sys.stderr)
-        print("FAILED NODES BATCH PAYLOAD", file=sys.stderr)
-        print("="*80, file=sys.stderr)
-        print(f"URL: {url}", file=sys.stderr)
-        print(f"Headers: {json.dumps(headers, indent=2)}", file=sys.stderr)
-        print(f"Payload:", file=sys.stderr)
-        print(json.dumps(payload, indent=2), file=sys.stderr)
-        print("="*80, file=sys.stderr)
+        # Write the failed payload to a file in one write rather than dumping it to STDERR
+        failed_path = write_failed_payload("nodes", body)
+        print(f"    Failed nodes batch ({len(nodes)} nodes) for {url} written to {failed_path}", file=sys.stderr)
         import traceback
         traceback.print_exc()
         raise
@@ -144,22 +200,25 @@ def create_relationships_batch(token: str, relationships: List[Dict[str, Any]])
         "relationships": relationships
     }
     
-    print("\n" + "="*80)
-    print("FULL POST REQUEST DETAILS - RELATIONSHIPS")
-    print("="*80)
-    print(f"URL: {url}")
-    print(f"\nHeaders:")
-    print(json.dumps(headers, indent=2))
-    print(f"\nPayload (Full - {len(relationships)} relationships):")
-    print(json.dumps(payload, indent=2))
-    print("="*80 + "\n")
-    
     if DEBUG_MODE:
+        # Pretty-printing the full payload is expensive, so only do it in debug mode
+        print("\n" + "="*80)
+        print("FULL POST REQUEST DETAILS - RELATIONSHIPS")
+        print("="*80)
+        print(f"URL: {url}")
+        print(f"\nHeaders:")
+        print(pretty_json(headers))
+        print(f"\nPayload (Full - {len(relationships)} relationships):")
+        print(pretty_json(payload))
+        print("="*80 + "\n")
         print("    [DEBUG MODE] Skipping actual POST request")
         return {"status": "debug", "relationships_processed": len(relationships)}
     
+    print(f"    POST {url} ({len(relationships)} relationships)")
+    
+    body = encode_json(payload)
     try:
-        response = requests.post(url, headers=headers, json=payload, verify=SSL_VERIFY)
+        response = SESSION.post(url, headers=headers, data=body, verify=SSL_VERIFY)
         print(f"    Response status: {response.status_code}")
         
         if response.status_code != 200 and response.status_code != 201:
@@ -171,16 +230,9 @@ def create_relationships_batch(token: str, relationships: List[Dict[str, Any]])
         return result
     except Exception as e:
         print(f"    Error: {e}")
-        # Write failed payload to STDERR
-        print(f"    Failed payload written to STDERR", file=sys.stderr)
-        print("="*80, file=sys.stderr)
-        print("FAILED RELATIONSHIPS BATCH PAYLOAD", file=sys.stderr)
-        print("="*80, file=sys.stderr)
-        print(f"URL: {url}", file=sys.stderr)
-        print(f"Headers: {json.dumps(headers, indent=2)}", file=sys.stderr)
-        print(f"Payload:", file=sys.stderr)
-        print(json.dumps(payload, indent=2), file=sys.stderr)
-        print("="*80, file=sys.stderr)
+        # Write the failed payload to a file in one write rather than dumping it to STDERR
+        failed_path = write_failed_payload("relationships", body)
+        print(f"    Failed relationships batch ({len(relationships)} relationships) for {url} written to {failed_path}", file=sys.stderr)
         import traceback
         traceback.print_exc()
         raise
@@ -206,79 +258,170 @@ def process_batch(batch_num, total_batches, batch, batch_type, token):
         return (batch_num, False, error_msg)
 
 
-def read_csv_data(file_path: str) -> List[Dict[str, str]]:
-    """Read CSV file and return list of dictionaries."""
-    data = []
-    with open(file_path, 'r', encoding='utf-8') as f:
+def iter_batches(items: Iterable[Dict[str, Any]], batch_size: int) -> Iterator[List[Dict[str, Any]]]:
+    """Yield successive lists of up to batch_size items from any iterable."""
+    items = iter(items)
+    batch = list(islice(items, batch_size))
+    while batch:
+        yield batch
+        batch = list(islice(items, batch_size))
+
+
+def report_batch_result(future, batch_num: int) -> bool:
+    """Print the outcome of a finished batch future and return whether it succeeded."""
+    try:
+        result_batch_num, success, message = future.result()
+        print(f"  {'✓' if success else '✗'} {message}")
+        return success
+    except Exception as e:
+        print(f"  ✗ Batch {batch_num} failed with exception: {e}")
+        return False
+
+
+def upload_batches(token: str, nodes: Iterable[Dict[str, Any]], total_nodes: int,
+                   relationships: Iterable[Dict[str, Any]], total_relationships: int,
+                   relationship_node_positions: Iterable[Tuple[int, int]],
+                   batch_size: int, max_threads: int):
+    """Upload nodes and then relationships in batches, running up to max_threads batches concurrently.
+    Items are consumed lazily: only a bounded number of batches are in memory at any time.
+    A relationship batch starts as soon as the node batches creating its endpoints have finished,
+    so relationship uploads overlap the tail of the node uploads. relationship_node_positions gives
+    each relationship's (source, target) positions in the node stream, in relationship order.
+    """
+    relationship_node_positions = iter(relationship_node_positions)
+    node_batch_done = {}  # node batch number -> Event set once that batch has finished
+    results = {"nodes": [0, 0], "relationships": [0, 0]}  # batch_type -> [completed, failed]
+    pending = {}  # future -> (batch_type, batch_num)
+    
+    def post_node_batch(batch_num, total_batches, batch):
+        try:
+            return process_batch(batch_num, total_batches, batch, "nodes", token)
+        finally:
+            node_batch_done[batch_num].set()
+    
+    def post_relationship_batch(batch_num, total_batches, batch, dependencies):
+        # Wait only for the node batches holding this batch's endpoints. All node batches are
+        # queued before any relationship batch, so the ones waited on are already running.
+        for dependency in dependencies:
+            node_batch_done[dependency].wait()
+        return process_batch(batch_num, total_batches, batch, "relationships", token)
+    
+    def record_results(futures):
+        for future in futures:
+            batch_type, batch_num = pending.pop(future)
+            results[batch_type][0 if report_batch_result(future, batch_num) else 1] += 1
+    
+    max_pending = max_threads * 2  # Keep workers busy without queueing every batch up front
+    with ThreadPoolExecutor(max_workers=max_threads) as executor:
+        for batch_type, items, total_items, post_batch in (
+            ("nodes", nodes, total_nodes, post_node_batch),
+            ("relationships", relationships, total_relationships, post_relationship_batch)
+        ):
+            print(f"\nCreating {batch_type} in batches of {batch_size}...")
+            
+            if total_items == 0:
+                print(f"  ERROR: No {batch_type} to create! Skipping {batch_type[:-1]} creation.")
+                continue
+            
+            total_batches = (total_items + batch_size - 1) // batch_size
+            print(f"  Processing {total_batches} batches with up to {max_threads} concurrent threads (BATCH_SIZE={batch_size}, MAX_THREADS={max_threads})...")
+            
+            for batch_num, batch in enumerate(iter_batches(items, batch_size), 1):
+                if batch_type == "nodes":
+                    node_batch_done[batch_num] = threading.Event()
+                    future = executor.submit(post_batch, batch_num, total_batches, batch)
+                else:
+                    # Node batch numbers follow from node positions, so no per-node lookup table is kept
+                    dependencies = {position // batch_size + 1
+                                    for positions in islice(relationship_node_positions, len(batch))
+                                    for position in positions}
+                    future = executor.submit(post_batch, batch_num, total_batches, batch, dependencies)
+                pending[future] = (batch_type, batch_num)
+                
+                # Wait for a batch to finish before building the next one
+                if len(pending) >= max_pending:
+                    done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                    record_results(done)
+        
+        # Process remaining batches
+        record_results(as_completed(list(pending)))
+    
+    for batch_type, (completed, failed) in results.items():
+        print(f"\n{batch_type.capitalize()}: {completed} batches completed, {failed} batches failed")
+
+
+def read_csv_data(file_path: str) -> List[List[str]]:
+    """Read CSV file and return its columns as lists of stripped strings.
+    Columns keep their CSV order, so column indices match EMISSION_TYPE_COLUMNS.
+    """
+    rows = []
+    # A 1 MiB buffer cuts read() syscalls on large files; newline='' is what csv expects
+    with open(file_path, 'r', encoding='utf-8', newline='', buffering=1 << 20) as f:
         reader = csv.reader(f)
         headers = next(reader)  # Skip header row
         
         for row in reader:
-            if len(row) < 21:
-                print(f"Warning: Row has fewer than 21 columns, skipping: {row}")
+            if len(row) < CSV_COLUMN_COUNT:
+                print(f"Warning: Row has fewer than {CSV_COLUMN_COUNT} columns, skipping: {row}")
                 continue
-            
-            # Map columns (0-indexed)
-            # Column A (index 0): name
-            # Column B (index 1): id/key
-            # Column C (index 2): year
-            # Column D (index 3): month
-            # Column E (index 4): day
-            data.append({
-                'name': row[0].strip() if len(row) > 0 else '',
-                'well_key': row[1].strip() if len(row) > 1 else '',
-                'year': row[2].strip() if len(row) > 2 else '',
-                'month': row[3].strip() if len(row) > 3 else '',
-                'day': row[4].strip() if len(row) > 4 else '',
-                'row_data': row  # Keep full row for accessing other columns
-            })
+            rows.append(row)
+    
+    if not rows:
+        return [[] for _ in range(CSV_COLUMN_COUNT)]
     
-    return data
+    # Transpose rows into columns (zip runs in C) instead of building a dict per row
+    # Column A (index 0): name
+    # Column B (index 1): id/key
+    # Column C (index 2): year
+    # Column D (index 3): month
+    # Column E (index 4): day
+    # Each cell is stripped exactly once here; map() runs str.strip without a Python-level loop
+    return [list(map(str.strip, column)) for column in zip(*rows)]
+
+
+# Characters a numeric cell can start with; anything else is rejected before calling float()
+NUMERIC_START_CHARS = frozenset("0123456789+-.")
+
+
+def parse_numeric_column(values: List[str], label: str) -> List[Optional[float]]:
+    """Convert a column of numeric strings to floats, using None for empty or invalid cells."""
+    numbers = []
+    for value in values:
+        number = None
+        if value:
+            # Screen out obviously non-numeric cells without paying for a raised ValueError
+            if value[0] in NUMERIC_START_CHARS:
+                try:
+                    number = float(value)
+                except ValueError:
+                    pass
+            if number is None:
+                print(f"    Warning: Could not convert {label} '{value}' to number, skipping")
+        numbers.append(number)
+    return numbers
 
 
-def group_data_by_well(data: List[Dict[str, str]]) -> Dict[str, List[Dict[str, str]]]:
-    """Group data by well key (Column B)."""
+def group_data_by_well(well_keys: List[str]) -> Dict[str, List[int]]:
+    """Group row indices by well key (Column B)."""
     grouped = defaultdict(list)
-    for row in data:
-        well_key = row['well_key']
+    for row_index, well_key in enumerate(well_keys):
         if well_key:
-            grouped[well_key].append(row)
+            grouped[well_key].append(row_index)
     return dict(grouped)
 
 
-def get_emission_type_columns(emission_type: str) -> Dict[str, int]:
-    """Map emission type to column indices.
-    This is a placeholder - you'll need to adjust based on your actual CSV structure.
-    Assuming columns are grouped: Flaring (5-8), ColdVentilation (9-12), DieselFuel (13-16), FuelGas (17-20)
-    """
-    # Adjust these indices based on your actual CSV structure
-    column_maps = {
-        'Flaring': {
-            'volume': 5,
-            'volume_uom': 6,
-            'mass': 7,
-            'mass_uom': 8
-        },
-        'ColdVentilation': {
-            'volume': 9,
-            'volume_uom': 10,
-            'mass': 11,
-            'mass_uom': 12
-        },
-        'DieselFuel': {
-            'volume': 13,
-            'volume_uom': 14,
-            'mass': 15,
-            'mass_uom': 16
-        },
-        'FuelGas': {
-            'volume': 17,
-            'volume_uom': 18,
-            'mass': 19,
-            'mass_uom': 20
-        }
-    }
-    return column_maps.get(emission_type, {})
+# Column indices (volume, volume_uom, mass, mass_uom) for each emission type.
+# Columns are grouped: Flaring (5-8), ColdVentilation (9-12), DieselFuel (13-16), FuelGas (17-20)
+EMISSION_TYPE_COLUMNS = {
+    'Flaring': (5, 6, 7, 8),
+    'ColdVentilation': (9, 10, 11, 12),
+    'DieselFuel': (13, 14, 15, 16),
+    'FuelGas': (17, 18, 19, 20)
+}
+
+# Rows are checked against this once when the CSV is read, so every column index above
+# is valid for every row and no per-cell length checks are needed afterwards
+CSV_COLUMN_COUNT = max(max(indices) for indices in EMISSION_TYPE_COLUMNS.values()) + 1
 
 
 def get_emission_type_display_name(emission_type: str) -> str:
@@ -292,12 +435,148 @@ def get_emission_type_display_name(emission_type: str) -> str:
     return display_names.get(emission_type, emission_type)
 
 
+def iter_nodes(well_info: Dict[str, Dict[str, Any]], emission_type_ids: Dict[Tuple[str, str], str],
+               date_entries: List[Dict[str, Any]]) -> Iterator[Dict[str, Any]]:
+    """Yield all nodes, one at a time, so the full node list never has to be held in memory."""
+    # Add Well nodes
+    for well_key, info in well_info.items():
+        yield {
+            "external_id": well_key,
+            "type": "Well",
+            "properties": convert_properties_to_array({"name": info['name']})
+        }
+    
+    # Add Emissions nodes
+    for well_key, info in well_info.items():
+        yield {
+            "external_id": info['emissions_id'],
+            "type": "Emissions",
+            "properties": convert_properties_to_array({"name": "Emissions"})
+        }
+    
+    # Add EmissionType nodes
+    for (well_key, emission_type), external_id in emission_type_ids.items():
+        yield {
+            "external_id": external_id,
+            "type": "EmissionType",
+            "properties": convert_properties_to_array({
+                "name": emission_type
+            })
+        }
+    
+    # Add date-specific nodes (hash-based external IDs were generated with the entries)
+    for entry in date_entries:
+        yield {
+            "external_id": entry['external_id'],
+            "type": entry['emission_type'],
+            "labels": ["Emission"],
+            "properties": entry['properties']
+        }
+
+
+def iter_relationships(well_info: Dict[str, Dict[str, Any]], emission_type_ids: Dict[Tuple[str, str], str],
+                       date_entries: List[Dict[str, Any]]) -> Iterator[Dict[str, Any]]:
+    """Yield all relationships, one at a time, in the same order as the nodes they connect."""
+    # Well -> Emissions relationships
+    for well_key, info in well_info.items():
+        yield {
+            "source": {
+                "type": "Well",
+                "external_id": well_key
+            },
+            "target": {
+                "type": "Emissions",
+                "external_id": info['emissions_id']
+            },
+            "type": "HAS_EMISSIONS"
+        }
+    
+    # Emissions -> EmissionType relationships
+    for (well_key, emission_type), emission_type_id in emission_type_ids.items():
+        yield {
+            "source": {
+                "type": "Emissions",
+                "external_id": well_info[well_key]['emissions_id']
+            },
+            "target": {
+                "type": "EmissionType",
+                "external_id": emission_type_id
+            },
+            "type": "HAS_TYPE"
+        }
+    
+    # EmissionType -> DateNode and DateNode -> DateNode relationships (maintaining order)
+    # date_entries is ordered by (well_key, emission_type), so each group is contiguous
+    for (well_key, emission_type), group in groupby(date_entries, key=itemgetter('well_key', 'emission_type')):
+        group = iter(group)
+        
+        # First date node for this emission type - connect to EmissionType
+        previous_node_id = next(group)['external_id']
+        yield {
+            "source": {
+                "type": "EmissionType",
+                "external_id": emission_type_ids[(well_key, emission_type)]
+            },
+            "target": {
+                "type": emission_type,
+                "external_id": previous_node_id
+            },
+            "type": "HAS_DATA"
+        }
+        
+        # Subsequent date nodes - connect each to the previous date node
+        for entry in group:
+            yield {
+                "source": {
+                    "type": emission_type,
+                    "external_id": previous_node_id
+                },
+                "target": {
+                    "type": emission_type,
+                    "external_id": entry['external_id']
+                },
+                "type": "NEXT_DATE"
+            }
+            previous_node_id = entry['external_id']
+
+
+def iter_relationship_node_positions(well_info: Dict[str, Dict[str, Any]], emission_type_ids: Dict[Tuple[str, str], str],
+                                    date_entries: List[Dict[str, Any]]) -> Iterator[Tuple[int, int]]:
+    """Yield the (source, target) positions in iter_nodes' output of each relationship from
+    iter_relationships, in the same order, so batch dependencies need no external_id lookup table.
+    """
+    emissions_start = len(well_info)
+    emission_types_start = 2 * len(well_info)
+    date_entries_start = emission_types_start + len(emission_type_ids)
+    well_index = {well_key: index for index, well_key in enumerate(well_info)}
+    emission_type_index = {key: index for index, key in enumerate(emission_type_ids)}
+    
+    # Well -> Emissions relationships
+    for index in range(len(well_info)):
+        yield index, emissions_start + index
+    
+    # Emissions -> EmissionType relationships
+    for index, (well_key, emission_type) in enumerate(emission_type_ids):
+        yield emissions_start + well_index[well_key], emission_types_start + index
+    
+    # EmissionType -> DateNode for the first entry of each group, DateNode -> DateNode for the rest
+    previous_group = None
+    for position, entry in enumerate(date_entries, date_entries_start):
+        group = (entry['well_key'], entry['emission_type'])
+        if group != previous_group:
+            yield emission_types_start + emission_type_index[group], position
+            previous_group = group
+        else:
+            yield position - 1, position
+
+
 def process_emissions_data(token: str, csv_file_path: str, batch_size: int = None, max_threads: int = None):
     """Main function to process CSV and load into IndyKite."""
     
     # Use provided values or defaults from environment
     actual_batch_size = batch_size if batch_size is not None else BATCH_SIZE
     actual_max_threads = max_threads if max_threads is not None else MAX_THREADS
+    configure_session(actual_max_threads)
     
     # Extract spreadsheet name from file path
     spreadsheet_name = os.path.basename(csv_file_path)
@@ -305,338 +584,144 @@ def process_emissions_data(token: str, csv_file_path: str, batch_size: int = Non
     # Get current timestamp for verified_time
     verified_time = datetime.now().isoformat() + "Z"
     
+    # Metadata shared by every volume/mass property; only the units differ per row
+    metadata_template = {
+        "source": spreadsheet_name,
+        "assurance_level": 3,
+        "verified_time": verified_time
+    }
+    
     # Read entire CSV file first
     print("Reading CSV file...")
-    csv_data = read_csv_data(csv_file_path)
-    print(f"Read {len(csv_data)} rows from CSV")
+    csv_columns = read_csv_data(csv_file_path)
+    names, well_keys, years, months, days = csv_columns[:5]
+    print(f"Read {len(well_keys)} rows from CSV")
     
     # Process all data and collect nodes/relationships
     emission_types = ['Flaring', 'ColdVentilation', 'DieselFuel', 'FuelGas']
-    all_nodes = []
-    all_relationships = []
     
     # Track well names and structure
     well_info = {}  # well_key -> {name, emissions_id, emission_type_ids}
     emission_type_ids = {}  # (well_key, emission_type) -> external_id
     
-    # Collect all date entries with their data
-    date_entries = []  # List of dicts with well_key, emission_type, date, properties
+    # Collect all date entries with their data, grouped by (well_key, emission_type)
+    date_groups = {}  # (well_key, emission_type) -> list of dicts with well_key, emission_type, date, external_id, properties
     
     print("Processing data and preparing nodes...")
     
+    # Convert each emission type's volume/mass columns to numbers once, up front
+    emission_columns = {}
+    for emission_type in emission_types:
+        volume_idx, volume_uom_idx, mass_idx, mass_uom_idx = EMISSION_TYPE_COLUMNS[emission_type]
+        emission_columns[emission_type] = (
+            parse_numeric_column(csv_columns[volume_idx], 'volume'),
+            csv_columns[volume_uom_idx],
+            parse_numeric_column(csv_columns[mass_idx], 'mass'),
+            csv_columns[mass_uom_idx]
+        )
+    
+    # Build each row's date string once; it is shared by all emission types
+    dates = list(map(create_date_string, years, months, days))
+    
     # Group by well
-    wells_data = group_data_by_well(csv_data)
+    wells_data = group_data_by_well(well_keys)
     print(f"Found {len(wells_data)} unique wells")
     
     # Process all rows to collect date entries
-    for well_key, well_rows in wells_data.items():
-        well_name = well_rows[0]['name'] if well_rows else well_key
+    for well_key, row_indices in wells_data.items():
+        well_name = names[row_indices[0]]
+        id_prefix = external_id_prefix(well_key)
         well_info[well_key] = {
             'name': well_name,
-            'emissions_id': generate_external_id(well_key, 'emissions', ''),
+            'emissions_id': generate_external_id(well_key, 'emissions', '', id_prefix),
             'emission_type_ids': {}
         }
         
         # Process each emission type
         for emission_type in emission_types:
-            emission_type_id = generate_external_id(well_key, f'emission_type_{emission_type}', '')
+            emission_type_id = generate_external_id(well_key, f'emission_type_{emission_type}', '', id_prefix)
             well_info[well_key]['emission_type_ids'][emission_type] = emission_type_id
             emission_type_ids[(well_key, emission_type)] = emission_type_id
             
-            column_map = get_emission_type_columns(emission_type)
+            volumes, volume_uoms, masses, mass_uoms = emission_columns[emission_type]
+            group_entries = date_groups.setdefault((well_key, emission_type), [])
             
-            for row in well_rows:
+            for i in row_indices:
                 try:
-                    date_str = create_date_string(row['year'], row['month'], row['day'])
+                    date_str = dates[i]
                     
-                    # Extract values from row based on column map
-                    row_data = row['row_data']
-                    volume_str = row_data[column_map['volume']].strip() if len(row_data) > column_map['volume'] else None
-                    volume_uom = row_data[column_map['volume_uom']].strip() if len(row_data) > column_map['volume_uom'] else None
-                    mass_str = row_data[column_map['mass']].strip() if len(row_data) > column_map['mass'] else None
-                    mass_uom = row_data[column_map['mass_uom']].strip() if len(row_data) > column_map['mass_uom'] else None
-                    
-                    # Convert volume and mass to numbers
-                    volume = None
-                    if volume_str:
-                        try:
-                            volume = float(volume_str)
-                        except ValueError:
-                            print(f"    Warning: Could not convert volume '{volume_str}' to number, skipping")
-                            volume = None
-                    
-                    mass = None
-                    if mass_str:
-                        try:
-                            mass = float(mass_str)
-                        except ValueError:
-                            print(f"    Warning: Could not convert mass '{mass_str}' to number, skipping")
-                            mass = None
+                    # Values were converted to numbers (or None) when the columns were parsed
+                    volume = volumes[i]
+                    volume_uom = volume_uoms[i]
+                    mass = masses[i]
+                    mass_uom = mass_uoms[i]
                     
                     # Only add if we have valid data
                     if volume is not None or mass is not None:
-                        # Build properties
-                        properties = {"date": date_str}
+                        # Build the node's properties array directly
+                        properties = [{"type": "date", "value": date_str}]
                         if volume is not None:
-                            properties['volume'] = volume
+                            volume_prop = {"type": "volume", "value": volume}
                             # Add volume_uom as metadata on volume property
                             if volume_uom:
-                                properties['_volume_metadata'] = {
-                                    "custom_metadata": {
-                                        "units": volume_uom
-                                    },
-                                    "source": spreadsheet_name,
-                                    "assurance_level": 3,
-                                    "verified_time": verified_time
-                                }
+                                volume_prop["metadata"] = {"custom_metadata": {"units": volume_uom}, **metadata_template}
+                            properties.append(volume_prop)
                         if mass is not None:
-                            properties['mass'] = mass
+                            mass_prop = {"type": "mass", "value": mass}
                             # Add mass_uom as metadata on mass property
                             if mass_uom:
-                                properties['_mass_metadata'] = {
-                                    "custom_metadata": {
-                                        "units": mass_uom
-                                    },
-                                    "source": spreadsheet_name,
-                                    "assurance_level": 3,
-                                    "verified_time": verified_time
-                                }
+                                mass_prop["metadata"] = {"custom_metadata": {"units": mass_uom}, **metadata_template}
+                            properties.append(mass_prop)
                         
-                        date_entries.append({
+                        group_entries.append({
                             'well_key': well_key,
                             'emission_type': emission_type,
                             'date': date_str,
+                            'external_id': generate_external_id(well_key, emission_type, date_str, id_prefix),
                             'properties': properties
                         })
                 except Exception as e:
                     print(f"    Error processing row: {e}")
                     continue
     
-    # Sort all date entries in reverse chronological order (most recent first)
+    # Sort all date entries in reverse chronological order (most recent first).
+    # Only the order within a (well_key, emission_type) group matters, so sort each
+    # small group by its ISO date rather than the whole list by a tuple key.
     print("Sorting data in reverse chronological order...")
-    date_entries.sort(key=lambda x: (x['well_key'], x['emission_type'], x['date']), reverse=True)
+    date_entries = []
+    for group_key in sorted(date_groups, reverse=True):
+        group_entries = date_groups[group_key]
+        group_entries.sort(key=itemgetter('date'), reverse=True)
+        date_entries.extend(group_entries)
     
-    # Build node list
-    print("Building node list...")
-    
-    # Add Well nodes
-    for well_key, info in well_info.items():
-        all_nodes.append({
-            "external_id": well_key,
-            "type": "Well",
-            "properties": convert_properties_to_array({"name": info['name']})
-        })
-    
-    # Add Emissions nodes
-    for well_key, info in well_info.items():
-        all_nodes.append({
-            "external_id": info['emissions_id'],
-            "type": "Emissions",
-            "properties": convert_properties_to_array({"name": "Emissions"})
-        })
+    # Nodes and relationships are generated lazily and uploaded as each batch fills up.
+    # Every date entry yields exactly one HAS_DATA or NEXT_DATE relationship.
+    total_nodes = 2 * len(well_info) + len(emission_type_ids) + len(date_entries)
+    total_relationships = len(well_info) + len(emission_type_ids) + len(date_entries)
     
-    # Add EmissionType nodes
-    for (well_key, emission_type), external_id in emission_type_ids.items():
-        all_nodes.append({
-            "external_id": external_id,
-            "type": "EmissionType",
-            "properties": convert_properties_to_array({
-                "name": emission_type
-            })
-        })
+    print(f"Prepared {total_nodes} nodes")
     
-    # Add date-specific nodes with hash-based external IDs
-    for entry in date_entries:
-        external_id = generate_external_id(entry['well_key'], entry['emission_type'], entry['date'])
-        all_nodes.append({
-            "external_id": external_id,
-            "type": entry['emission_type'],
-            "labels": ["Emission"],
-            "properties": convert_properties_to_array(entry['properties'])
-        })
-    
-    print(f"Prepared {len(all_nodes)} nodes")
-    
-    # Debug: Show breakdown of node types
-    if all_nodes:
-        node_types = {}
-        for node in all_nodes:
-            node_type = node.get('type', 'Unknown')
-            node_types[node_type] = node_types.get(node_type, 0) + 1
-        print(f"  Node breakdown: {node_types}")
-    else:
+    if not total_nodes:
         print("  WARNING: No nodes prepared! Check CSV data processing.")
+    elif DEBUG_MODE:
+        # Debug: Show breakdown of node types (walks every node, so only in debug mode)
+        node_types = Counter(node.get('type', 'Unknown') for node in iter_nodes(well_info, emission_type_ids, date_entries))
+        print(f"  Node breakdown: {dict(node_types)}")
     
-    # Build relationship list
-    print("Building relationship list...")
-    
-    # Well -> Emissions relationships
-    for well_key, info in well_info.items():
-        all_relationships.append({
-            "source": {
-                "type": "Well",
-                "external_id": well_key
-            },
-            "target": {
-                "type": "Emissions",
-                "external_id": info['emissions_id']
-            },
-            "type": "HAS_EMISSIONS"
-        })
-    
-    # Emissions -> EmissionType relationships
-    for (well_key, emission_type), emission_type_id in emission_type_ids.items():
-        all_relationships.append({
-            "source": {
-                "type": "Emissions",
-                "external_id": well_info[well_key]['emissions_id']
-            },
-            "target": {
-                "type": "EmissionType",
-                "external_id": emission_type_id
-            },
-            "type": "HAS_TYPE"
-        })
+    print(f"Prepared {total_relationships} relationships")
     
-    # EmissionType -> DateNode and DateNode -> DateNode relationships (maintaining order)
-    # Group date entries by (well_key, emission_type) and process in order
-    current_groups = {}
-    for entry in date_entries:
-        key = (entry['well_key'], entry['emission_type'])
-        date_node_id = generate_external_id(entry['well_key'], entry['emission_type'], entry['date'])
-        
-        if key not in current_groups:
-            # First date node for this emission type - connect to EmissionType
-            emission_type_id = emission_type_ids[key]
-            emission_type_name = entry['emission_type']  # Get the emission type name
-            all_relationships.append({
-                "source": {
-                    "type": "EmissionType",
-                    "external_id": emission_type_id
-                },
-                "target": {
-                    "type": emission_type_name,
-                    "external_id": date_node_id
-                },
-                "type": "HAS_DATA"
-            })
-            current_groups[key] = date_node_id
-        else:
-            # Subsequent date node - connect to previous date node
-            previous_node_id = current_groups[key]
-            emission_type_name = entry['emission_type']  # Get the emission type name
-            all_relationships.append({
-                "source": {
-                    "type": emission_type_name,
-                    "external_id": previous_node_id
-                },
-                "target": {
-                    "type": emission_type_name,
-                    "external_id": date_node_id
-                },
-                "type": "NEXT_DATE"
-            })
-            current_groups[key] = date_node_id
-    
-    print(f"Prepared {len(all_relationships)} relationships")
-    
-    # Debug: Show breakdown of relationship types
-    if all_relationships:
-        rel_types = {}
-        for rel in all_relationships:
-            rel_type = rel.get('type', 'Unknown')
-            rel_types[rel_type] = rel_types.get(rel_type, 0) + 1
-        print(f"  Relationship breakdown: {rel_types}")
-    else:
+    if not total_relationships:
         print("  WARNING: No relationships prepared! Check CSV data processing.")
-    
-    # Create nodes in batches
-    print(f"\nCreating nodes in batches of {actual_batch_size}...")
-    total_nodes = len(all_nodes)
-    
-    if total_nodes == 0:
-        print("  ERROR: No nodes to create! Skipping node creation.")
-    else:
-        # Prepare all batches
-        batches = []
-        for i in range(0, total_nodes, actual_batch_size):
-            batch = all_nodes[i:i + actual_batch_size]
-            batch_num = (i // actual_batch_size) + 1
-            total_batches = (total_nodes + actual_batch_size - 1) // actual_batch_size
-            batches.append((batch_num, total_batches, batch))
-        
-        # Process batches concurrently using ThreadPoolExecutor
-        max_workers = min(actual_max_threads, len(batches))
-        print(f"  Processing {len(batches)} batches with up to {max_workers} concurrent threads (BATCH_SIZE={actual_batch_size}, MAX_THREADS={actual_max_threads})...")
-        with ThreadPoolExecutor(max_workers=max_workers) as executor:
-            # Submit all batches
-            future_to_batch = {
-                executor.submit(process_batch, batch_num, total_batches, batch, "nodes", token): (batch_num, total_batches)
-                for batch_num, total_batches, batch in batches
-            }
-            
-            # Process completed batches
-            completed = 0
-            failed = 0
-            for future in as_completed(future_to_batch):
-                batch_num, total_batches = future_to_batch[future]
-                try:
-                    result_batch_num, success, message = future.result()
-                    if success:
-                        completed += 1
-                        print(f"  ✓ {message}")
-                    else:
-                        failed += 1
-                        print(f"  ✗ {message}")
-                except Exception as e:
-                    failed += 1
-                    print(f"  ✗ Batch {batch_num} failed with exception: {e}")
-        
-        print(f"\nNodes: {completed} batches completed, {failed} batches failed")
-    
-    # Create relationships in batches
-    print(f"\nCreating relationships in batches of {actual_batch_size}...")
-    total_relationships = len(all_relationships)
-    
-    if total_relationships == 0:
-        print("  ERROR: No relationships to create! Skipping relationship creation.")
-    else:
-        # Prepare all batches
-        batches = []
-        for i in range(0, total_relationships, actual_batch_size):
-            batch = all_relationships[i:i + actual_batch_size]
-            batch_num = (i // actual_batch_size) + 1
-            total_batches = (total_relationships + actual_batch_size - 1) // actual_batch_size
-            batches.append((batch_num, total_batches, batch))
-        
-        # Process batches concurrently using ThreadPoolExecutor
-        max_workers = min(actual_max_threads, len(batches))
-        print(f"  Processing {len(batches)} batches with up to {max_workers} concurrent threads (BATCH_SIZE={actual_batch_size}, MAX_THREADS={actual_max_threads})...")
-        with ThreadPoolExecutor(max_workers=max_workers) as executor:
-            # Submit all batches
-            future_to_batch = {
-                executor.submit(process_batch, batch_num, total_batches, batch, "relationships", token): (batch_num, total_batches)
-                for batch_num, total_batches, batch in batches
-            }
-            
-            # Process completed batches
-            completed = 0
-            failed = 0
-            for future in as_completed(future_to_batch):
-                batch_num, total_batches = future_to_batch[future]
-                try:
-                    result_batch_num, success, message = future.result()
-                    if success:
-                        completed += 1
-                        print(f"  ✓ {message}")
-                    else:
-                        failed += 1
-                        print(f"  ✗ {message}")
-                except Exception as e:
-                    failed += 1
-                    print(f"  ✗ Batch {batch_num} failed with exception: {e}")
-        
-        print(f"\nRelationships: {completed} batches completed, {failed} batches failed")
+    elif DEBUG_MODE:
+        # Debug: Show breakdown of relationship types (walks every relationship, so only in debug mode)
+        rel_types = Counter(rel.get('type', 'Unknown') for rel in iter_relationships(well_info, emission_type_ids, date_entries))
+        print(f"  Relationship breakdown: {dict(rel_types)}")
+    
+    upload_batches(token,
+                   iter_nodes(well_info, emission_type_ids, date_entries), total_nodes,
+                   iter_relationships(well_info, emission_type_ids, date_entries), total_relationships,
+                   iter_relationship_node_positions(well_info, emission_type_ids, date_entries),
+                   actual_batch_size, actual_max_threads)
 
 
 def main():
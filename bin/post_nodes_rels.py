@@ -4,8 +4,31 @@ import json
 import os
 import sys
 import argparse
+import atexit
+import threading
+import gzip
+import mmap
+import queue
+import re
+import uuid
 import requests
+from itertools import islice
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, as_completed, wait
 from dotenv import load_dotenv
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+try:
+    import orjson
+except ImportError:  # orjson is optional; fall back to the stdlib encoder
+    orjson = None
+
+try:
+    import ijson
+    STREAM_PARSE_ERRORS = (ijson.JSONError,)
+except ImportError:  # ijson is only needed for --stream
+    ijson = None
+    STREAM_PARSE_ERRORS = ()
 
 # Load environment variables from .env file
 load_dotenv()
@@ -14,6 +37,32 @@ load_dotenv()
 INDYKITE_HOST = os.getenv("INDYKITE_HOST", "https://api.indykite.com")
 INDYKITE_TOKEN = os.getenv("INDYKITE_TOKEN")
 SSL_VERIFY = os.getenv("SSL_VERIFY", "false").lower() != "false"
+MAX_THREADS = int(os.getenv("MAX_THREADS", "6"))
+FAILED_BATCH_DIR = os.getenv("FAILED_BATCH_DIR", "failed_batches")
+# Default number of items posted per request (--batch-size)
+DEFAULT_BATCH_SIZE = 1000
+# Wire format for request bodies: "json" (default) or "msgpack" (opt-in, requires msgspec)
+WIRE_FORMAT = os.getenv("WIRE_FORMAT", "json").lower()
+MSGPACK_CONTENT_TYPE = "application/msgpack"
+# Gzip request bodies larger than GZIP_MIN_BYTES (opt-in; the server must accept Content-Encoding: gzip)
+COMPRESS_REQUESTS = os.getenv("COMPRESS_REQUESTS", "false").lower() == "true"
+GZIP_MIN_BYTES = 4096
+# Bytes of a failed payload echoed to STDERR; the full payload goes to FAILED_BATCH_DIR
+ERROR_PREVIEW_BYTES = 4096
+# Batches parsed ahead of the uploaders when items are parsed lazily (--stream)
+PREFETCH_BATCHES = 4
+# Bytes read from the start of a file to detect its type without parsing all of it
+SNIFF_BYTES = 4096
+UTF8_BOM = b'\xef\xbb\xbf'
+
+try:
+    import msgspec
+except ImportError:  # msgspec is only needed for WIRE_FORMAT=msgpack and the raw JSON fast path
+    msgspec = None
+
+# The raw JSON fast path (load_raw_items) needs orjson.Fragment (orjson 3.9+) and msgspec.json.format
+RAW_ITEMS_SUPPORTED = (orjson is not None and hasattr(orjson, "Fragment")
+                       and msgspec is not None and hasattr(msgspec.json, "format"))
 
 # Disable SSL warnings if verification is disabled
 if not SSL_VERIFY:
@@ -21,15 +70,116 @@ if not SSL_VERIFY:
     urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
     print("⚠️  WARNING: SSL certificate verification is DISABLED")
 
+# Request headers shared by every capture API call
+_HEADERS = {
+    "X-IK-ClientKey": INDYKITE_TOKEN,
+    "Content-Type": "application/json"
+}
+_OK_STATUSES = frozenset((200, 201))
+
+# (connect, read) timeouts in seconds for capture API requests
+REQUEST_TIMEOUT = (5, 60)
+
+# Retry rate-limited and transient server errors with exponential backoff (0.5s, 1s, 2s, ...), waiting
+# for Retry-After when the server sends it. POST is retried too: the capture API upserts by external_id,
+# so re-sending a batch is safe. The last response is returned rather than raised so its details are printed.
+RETRY = Retry(
+    total=5,
+    backoff_factor=0.5,
+    status_forcelist=(429, 500, 502, 503, 504),
+    respect_retry_after_header=True,
+    allowed_methods=frozenset(["POST"]),
+    raise_on_status=False
+)
+
+# Shared session so repeated posts to INDYKITE_HOST reuse one keep-alive connection
+# instead of paying a new TCP/TLS handshake per request
+SESSION = requests.Session()
+SESSION.headers.update({"Content-Type": "application/json", "Connection": "keep-alive"})
+
+
+def configure_session(pool_size: int) -> None:
+    """Size the shared session's connection pool to the number of worker threads, so each
+    concurrent batch keeps its own keep-alive connection instead of reconnecting.
+    """
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_size, max_retries=RETRY)
+    SESSION.mount("https://", adapter)
+    SESSION.mount("http://", adapter)
+
+
+configure_session(MAX_THREADS)
+
+
+def close_session():
+    """Close the shared session and its pooled connections."""
+    SESSION.close()
+
+
+atexit.register(close_session)
+
 
-def post_nodes(token: str, nodes: list):
+def encode_json(payload) -> bytes:
+    """Serialize a payload to compact JSON bytes, using orjson when it is installed."""
+    if orjson is not None:
+        return orjson.dumps(payload)
+    return json.dumps(payload, separators=(",", ":")).encode("utf-8")
+
+
+def pretty_json(payload) -> str:
+    """Format a payload as indented JSON for error and result output."""
+    if orjson is not None:
+        return orjson.dumps(payload, option=orjson.OPT_INDENT_2).decode("utf-8")
+    return json.dumps(payload, indent=2)
+
+
+def send_payload(url: str, headers: dict, payload) -> requests.Response:
+    """POST a payload in the configured wire format, falling back to JSON if msgpack is rejected."""
+    global WIRE_FORMAT
+    if WIRE_FORMAT == "msgpack":
+        msgpack_headers = {**headers, "Content-Type": MSGPACK_CONTENT_TYPE, "Accept": f"{MSGPACK_CONTENT_TYPE}, application/json"}
+        response = SESSION.post(url, headers=msgpack_headers, data=msgspec.msgpack.encode(payload),
+                                verify=SSL_VERIFY, timeout=REQUEST_TIMEOUT)
+        if response.status_code != 415:
+            return response
+        print("Server does not accept msgpack (415 Unsupported Media Type), falling back to JSON")
+        WIRE_FORMAT = "json"
+    
+    # Pre-encode the body as UTF-8 JSON bytes rather than letting requests run json.dumps
+    body = encode_json(payload)
+    if COMPRESS_REQUESTS and len(body) > GZIP_MIN_BYTES:
+        # Level 1 gets most of the ratio on repetitive JSON for a fraction of the CPU of level 9
+        body = gzip.compress(body, compresslevel=1)
+        headers = {**headers, "Content-Encoding": "gzip"}
+    return SESSION.post(url, headers=headers, data=body, verify=SSL_VERIFY, timeout=REQUEST_TIMEOUT)
+
+
+def _loads(response: requests.Response):
+    """Decode a JSON response body straight from its bytes, using orjson when it is installed."""
+    if orjson is not None:
+        return orjson.loads(response.content)
+    return response.json()
+
+
+def parse_response(response: requests.Response):
+    """Decode a successful response body, which is msgpack if the server chose to reply in it."""
+    if response.headers.get("Content-Type", "").startswith(MSGPACK_CONTENT_TYPE):
+        return msgspec.msgpack.decode(response.content)
+    return _loads(response)
+
+
+def write_failed_payload(batch_type: str, body: bytes) -> str:
+    """Write a failed batch's JSON body to a uniquely named file in FAILED_BATCH_DIR and return its path."""
+    os.makedirs(FAILED_BATCH_DIR, exist_ok=True)
+    file_path = os.path.join(FAILED_BATCH_DIR, f"failed_{batch_type}_batch_{uuid.uuid4().hex}.json")
+    with open(file_path, 'wb') as f:
+        f.write(body)
+    return file_path
+
+
+def post_nodes(nodes: list):
     """Post nodes to IndyKite capture API."""
     url = f"{INDYKITE_HOST}/capture/v1/nodes"
-    
-    headers = {
-        "X-IK-ClientKey": token,
-        "Content-Type": "application/json"
-    }
+    headers = _HEADERS
     
     payload = {
         "nodes": nodes
@@ -38,10 +188,10 @@ def post_nodes(token: str, nodes: list):
     print(f"POST {url}")
     print(f"Sending {len(nodes)} nodes...")
     
-    response = requests.post(url, headers=headers, json=payload, verify=SSL_VERIFY)
+    response = send_payload(url, headers, payload)
     print(f"Response status: {response.status_code}")
     
-    if response.status_code != 200 and response.status_code != 201:
+    if response.status_code not in _OK_STATUSES:
         print(f"\n{'='*80}")
         print(f"ERROR DETAILS (Status {response.status_code})")
         print(f"{'='*80}")
@@ -54,9 +204,9 @@ def post_nodes(token: str, nodes: list):
         # Try to parse and pretty-print JSON error response
         print("\nResponse Body:")
         try:
-            error_json = response.json()
-            print(json.dumps(error_json, indent=2))
-        except (json.JSONDecodeError, ValueError):
+            error_json = _loads(response)
+            print(pretty_json(error_json))
+        except ValueError:  # json and orjson decode errors are both ValueErrors
             # If not JSON, just print the raw text
             print(response.text)
         
@@ -69,28 +219,27 @@ def post_nodes(token: str, nodes: list):
             print("  - Server-side validation failure")
             print("  - Backend service issue")
         
-        print("\nFailed payload written to STDERR", file=sys.stderr)
+        # Write the full payload to a file and echo only its start, since pretty-printing a large
+        # payload to STDERR is slow and memory hungry
+        body = encode_json(payload)
+        failed_path = write_failed_payload("nodes", body)
+        print(f"\nFailed payload written to {failed_path}", file=sys.stderr)
         print("="*80, file=sys.stderr)
         print("FAILED NODES PAYLOAD", file=sys.stderr)
         print("="*80, file=sys.stderr)
         print(f"URL: {url}", file=sys.stderr)
-        print(f"Headers: {json.dumps(headers, indent=2)}", file=sys.stderr)
-        print(f"Payload:", file=sys.stderr)
-        print(json.dumps(payload, indent=2), file=sys.stderr)
+        print(f"Payload size: {len(body)} bytes, first {ERROR_PREVIEW_BYTES} bytes:", file=sys.stderr)
+        print(body[:ERROR_PREVIEW_BYTES].decode("utf-8", errors="replace"), file=sys.stderr)
         print("="*80, file=sys.stderr)
         response.raise_for_status()
     
-    return response.json()
+    return parse_response(response)
 
 
-def post_relationships(token: str, payload):
+def post_relationships(payload):
     """Post relationships to IndyKite capture API."""
     url = f"{INDYKITE_HOST}/capture/v1/relationships"
-    
-    headers = {
-        "X-IK-ClientKey": token,
-        "Content-Type": "application/json"
-    }
+    headers = _HEADERS
     
     # Determine count for logging
     if isinstance(payload, dict) and "relationships" in payload:
@@ -103,10 +252,10 @@ def post_relationships(token: str, payload):
     print(f"POST {url}")
     print(f"Sending {count} relationships...")
     
-    response = requests.post(url, headers=headers, json=payload, verify=SSL_VERIFY)
+    response = send_payload(url, headers, payload)
     print(f"Response status: {response.status_code}")
     
-    if response.status_code != 200 and response.status_code != 201:
+    if response.status_code not in _OK_STATUSES:
         print(f"\n{'='*80}")
         print(f"ERROR DETAILS (Status {response.status_code})")
         print(f"{'='*80}")
@@ -119,9 +268,9 @@ def post_relationships(token: str, payload):
         # Try to parse and pretty-print JSON error response
         print("\nResponse Body:")
         try:
-            error_json = response.json()
-            print(json.dumps(error_json, indent=2))
-        except (json.JSONDecodeError, ValueError):
+            error_json = _loads(response)
+            print(pretty_json(error_json))
+        except ValueError:  # json and orjson decode errors are both ValueErrors
             # If not JSON, just print the raw text
             print(response.text)
         
@@ -134,18 +283,217 @@ def post_relationships(token: str, payload):
             print("  - Server-side validation failure")
             print("  - Backend service issue")
         
-        print("\nFailed payload written to STDERR", file=sys.stderr)
+        # Write the full payload to a file and echo only its start, since pretty-printing a large
+        # payload to STDERR is slow and memory hungry
+        body = encode_json(payload)
+        failed_path = write_failed_payload("relationships", body)
+        print(f"\nFailed payload written to {failed_path}", file=sys.stderr)
         print("="*80, file=sys.stderr)
         print("FAILED RELATIONSHIPS PAYLOAD", file=sys.stderr)
         print("="*80, file=sys.stderr)
         print(f"URL: {url}", file=sys.stderr)
-        print(f"Headers: {json.dumps(headers, indent=2)}", file=sys.stderr)
-        print(f"Payload:", file=sys.stderr)
-        print(json.dumps(payload, indent=2), file=sys.stderr)
+        print(f"Payload size: {len(body)} bytes, first {ERROR_PREVIEW_BYTES} bytes:", file=sys.stderr)
+        print(body[:ERROR_PREVIEW_BYTES].decode("utf-8", errors="replace"), file=sys.stderr)
         print("="*80, file=sys.stderr)
         response.raise_for_status()
     
-    return response.json()
+    return parse_response(response)
+
+
+def load_json_file(file_path: str):
+    """Read and parse a JSON file from bytes, using orjson when it is installed."""
+    with open(file_path, 'rb') as f:
+        if orjson is None:
+            return json.load(f)
+        try:
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:  # Empty files cannot be mapped
+            return orjson.loads(f.read().removeprefix(UTF8_BOM))
+    
+    # Parse straight from the memory map so the file is never copied into a bytes object first
+    with mapped, memoryview(mapped) as view:
+        if view[:len(UTF8_BOM)] == UTF8_BOM:
+            with view[len(UTF8_BOM):] as body:
+                return orjson.loads(body)
+        return orjson.loads(view)
+
+
+def load_raw_items(file_path: str, item_prefix: str) -> list:
+    """Split the array at item_prefix (e.g. "nodes.item") into each item's minified JSON text, without
+    building Python objects for the items. The returned orjson Fragments are written into request
+    bodies as-is, so items are never decoded and re-encoded.
+    """
+    with open(file_path, 'rb') as f:
+        mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    
+    # Decode straight from the memory map, as load_json_file does
+    value = memoryview(mapped)
+    if value[:len(UTF8_BOM)] == UTF8_BOM:
+        value = value[len(UTF8_BOM):]
+    *keys, _ = item_prefix.split(".")
+    for key in keys:
+        value = msgspec.json.decode(value, type=dict[str, msgspec.Raw])[key]
+    
+    # Minifying copies each item out of the map and drops the file's indentation from request bodies
+    items = [orjson.Fragment(msgspec.json.format(item, indent=-1))
+             for item in msgspec.json.decode(value, type=list[msgspec.Raw])]
+    
+    # No slices of the map remain, so it can be closed now rather than when it is collected
+    del value
+    mapped.close()
+    return items
+
+
+def iter_stream_items(file_path: str, item_prefix: str):
+    """Incrementally parse a file and yield the items found at item_prefix (e.g. "nodes.item" for
+    {"nodes": [...]}, "item" for a bare array) one at a time, so the whole array never sits in memory at once.
+    """
+    with open(file_path, 'rb') as f:
+        if f.read(len(UTF8_BOM)) != UTF8_BOM:
+            f.seek(0)
+        yield from ijson.items(f, item_prefix, use_float=True)
+
+
+def iter_batches(items, batch_size: int):
+    """Yield successive lists of up to batch_size items from any iterable."""
+    items = iter(items)
+    batch = list(islice(items, batch_size))
+    while batch:
+        yield batch
+        batch = list(islice(items, batch_size))
+
+
+def prefetch_batches(batches, depth: int = PREFETCH_BATCHES):
+    """Pull batches on a background thread into a bounded queue, so parsing the next batches overlaps
+    with posting the current ones instead of running in between them.
+    """
+    batch_queue = queue.Queue(maxsize=depth)
+    stop = threading.Event()
+    done = object()
+    
+    def put(item) -> bool:
+        # Give up if the consumer has stopped, rather than blocking on a full queue forever
+        while not stop.is_set():
+            try:
+                batch_queue.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+    
+    def produce():
+        try:
+            for batch in batches:
+                if not put(batch):
+                    return
+        except Exception as e:  # Re-raised on the consuming thread
+            put(e)
+            return
+        put(done)
+    
+    threading.Thread(target=produce, daemon=True).start()
+    try:
+        while (item := batch_queue.get()) is not done:
+            if isinstance(item, Exception):
+                raise item
+            yield item
+    finally:
+        stop.set()
+
+
+def read_progress(progress_path: str) -> int:
+    """Return how many items a previous run recorded as posted, or 0 if there is no progress file."""
+    try:
+        with open(progress_path, 'r') as f:
+            return int(f.read().strip() or 0)
+    except FileNotFoundError:
+        return 0
+
+
+def write_progress(progress_path: str, posted: int):
+    """Record how many items have been posted so far."""
+    with open(progress_path, 'w') as f:
+        f.write(str(posted))
+
+
+def post_batch(data_type: str, batch: list):
+    """Post one batch of nodes or relationships and return the API response."""
+    if data_type == "nodes":
+        return post_nodes(batch)
+    return post_relationships({"relationships": batch})
+
+
+def post_batches(items, data_type: str, batch_size: int, max_threads: int,
+                 progress_path: str, resume: bool, verbose: bool = False) -> int:
+    """Post items in batches of batch_size, up to max_threads batches at a time, recording progress
+    so an interrupted run can resume without re-posting. Returns a process exit code.
+    """
+    start = read_progress(progress_path) if resume else 0
+    if start:
+        print(f"Resuming: skipping {start} {data_type} already posted")
+    
+    posted = start  # Items covered by the unbroken run of completed batches from the start
+    next_batch = 0  # Index of the first batch not yet counted in posted
+    finished = {}  # Batch index -> size, for batches that completed ahead of next_batch
+    pending = {}  # Future -> (batch index, size)
+    error = None
+    parse_error = None
+    
+    def record_results(futures):
+        nonlocal posted, next_batch, error
+        for future in futures:
+            index, size = pending.pop(future)
+            try:
+                result = future.result()
+            except Exception as e:
+                error = error or e
+                continue
+            if verbose:
+                print(f"Response: {pretty_json(result)}")
+            finished[index] = size
+        
+        # Batches can finish out of order; only advance progress over contiguous completed batches
+        if next_batch in finished:
+            while next_batch in finished:
+                posted += finished.pop(next_batch)
+                next_batch += 1
+            write_progress(progress_path, posted)
+    
+    batches = iter_batches(islice(items, start, None), batch_size)
+    if not isinstance(items, list):
+        batches = prefetch_batches(batches)  # Items are parsed lazily; parse ahead on another thread
+    
+    with ThreadPoolExecutor(max_workers=max_threads) as executor:
+        try:
+            for index, batch in enumerate(batches):
+                if error is not None:
+                    break  # Stop submitting after a failure; in-flight batches still finish
+                pending[executor.submit(post_batch, data_type, batch)] = (index, len(batch))
+                
+                # Bound the number of batches held in memory while keeping every worker busy
+                if len(pending) >= max_threads * 2:
+                    done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                    record_results(done)
+        except STREAM_PARSE_ERRORS as e:
+            # A streamed file turned out to be malformed part way; treat it like a failed batch
+            parse_error = e
+        finally:
+            batches.close()  # Stops the prefetch thread now rather than when the generator is collected
+        
+        record_results(as_completed(list(pending)))
+    
+    if error is not None or parse_error is not None:
+        if error is not None:
+            print(f"\nError posting {data_type}: {error}")
+        if parse_error is not None:
+            print(f"\nError: Invalid JSON file: {parse_error}")
+        print(f"{posted} {data_type} were posted; re-run with --resume to continue from there")
+        return 1
+    
+    if os.path.exists(progress_path):
+        os.remove(progress_path)
+    print(f"\nSuccessfully posted {posted - start} {data_type}")
+    return 0
 
 
 def detect_type(data):
@@ -154,6 +502,9 @@ def detect_type(data):
         # Check if it's a nodes payload with "nodes" key
         if "nodes" in data and isinstance(data["nodes"], list):
             return "nodes"
+        # Check if it's a relationships payload with "relationships" key
+        if "relationships" in data and isinstance(data["relationships"], list):
+            return "relationships"
         # Check if it has node-like structure (external_id, type, properties)
         if "external_id" in data and "type" in data:
             return "nodes"
@@ -172,6 +523,52 @@ def detect_type(data):
     return None
 
 
+_WRAPPER_KEY = re.compile(rb'\s*\{\s*"(nodes|relationships)"\s*:')
+
+
+def sniff_type(file_path: str):
+    """Detect nodes vs relationships from the first SNIFF_BYTES of a file, parsing at most its first item.
+    Returns (data_type, item_prefix): data_type is None if the snippet is ambiguous, and item_prefix
+    (the ijson path of the items) is None if the file's shape could not be determined.
+    """
+    with open(file_path, 'rb') as f:
+        head = f.read(SNIFF_BYTES).removeprefix(UTF8_BOM)
+    
+    # {"nodes": ...} / {"relationships": ...} wrappers name the type outright
+    keys = []
+    pos = 0
+    while len(keys) < 2 and (match := _WRAPPER_KEY.match(head, pos)):
+        keys.append(match.group(1).decode())
+        pos = match.end()
+    # Only accept the wrappers main() unwraps, so a sniffed file loads the same way it is streamed
+    if keys and keys not in (["nodes"], ["nodes", "nodes"], ["relationships"]):
+        return None, None
+    rest = head[pos:].lstrip()
+    if rest.startswith(b'['):
+        item_prefix = ".".join(keys + ["item"])
+    elif rest.startswith(b'{') and keys:
+        item_prefix = ".".join(keys)  # A wrapped single item
+    elif rest.startswith(b'{'):
+        item_prefix = None  # A single item, or a wrapper whose "nodes" key is not the first
+    else:
+        return None, None
+    if keys:
+        return keys[-1], item_prefix
+    
+    # Otherwise parse just the first item; it may be cut off by the snippet, in which case the caller
+    # falls back to a full parse
+    text = rest.decode("utf-8", errors="ignore")
+    try:
+        first_item, _ = json.JSONDecoder().raw_decode(text, text.find("{"))
+    except ValueError:
+        return None, item_prefix
+    if item_prefix is None:
+        data_type = detect_type(first_item)
+        is_wrapper = "nodes" in first_item or "relationships" in first_item
+        return data_type, None if is_wrapper or not data_type else ""
+    return detect_type([first_item]), item_prefix
+
+
 def main():
     """Main entry point."""
     parser = argparse.ArgumentParser(
@@ -187,6 +584,33 @@ def main():
         default=None,
         help="Explicitly specify type (nodes or relationships). If not provided, will auto-detect."
     )
+    parser.add_argument(
+        "--batch-size",
+        type=int,
+        default=DEFAULT_BATCH_SIZE,
+        help=f"Number of items per request (default: {DEFAULT_BATCH_SIZE})"
+    )
+    parser.add_argument(
+        "--max-threads",
+        type=int,
+        default=MAX_THREADS,
+        help=f"Maximum number of batches posted concurrently (default: {MAX_THREADS} from env or 6)"
+    )
+    parser.add_argument(
+        "--stream",
+        action="store_true",
+        help="Parse the file incrementally instead of loading it all at once (requires the ijson package)"
+    )
+    parser.add_argument(
+        "--resume",
+        action="store_true",
+        help="Skip items recorded as posted by a previous interrupted run (tracked in <json_file>.progress)"
+    )
+    parser.add_argument(
+        "--verbose",
+        action="store_true",
+        help="Print the API response for every batch"
+    )
     
     args = parser.parse_args()
     
@@ -205,10 +629,59 @@ def main():
         print(f"Error: JSON file not found: {args.json_file}")
         return 1
     
+    if WIRE_FORMAT == "msgpack" and msgspec is None:
+        print("Error: WIRE_FORMAT=msgpack requires the msgspec package (pip install msgspec)")
+        return 1
+    
+    if args.batch_size < 1 or args.max_threads < 1:
+        print("Error: --batch-size and --max-threads must be at least 1")
+        return 1
+    
+    if args.max_threads != MAX_THREADS:
+        configure_session(args.max_threads)
+    
+    # Number of items successfully posted is recorded here so --resume can pick up after a failure
+    progress_path = f"{args.json_file}.progress"
+    
+    # Detect the type from the start of the file so streaming can begin without a full parse
+    data_type = args.type
+    try:
+        sniffed_type, item_prefix = sniff_type(args.json_file)
+    except OSError as e:
+        print(f"Error reading file: {e}")
+        return 1
+    if not data_type and sniffed_type:
+        data_type = sniffed_type
+        print(f"Auto-detected type: {data_type}")
+    
+    if args.stream:
+        if not data_type:
+            print("Error: Could not determine if data is nodes or relationships.")
+            print("Please specify --type nodes or --type relationships")
+            return 1
+        if ijson is None:
+            print("Error: --stream requires the ijson package (pip install ijson)")
+            return 1
+        if item_prefix is None:
+            item_prefix = f"{data_type}.item"
+        return post_batches(iter_stream_items(args.json_file, item_prefix), data_type, args.batch_size,
+                            args.max_threads, progress_path, args.resume, args.verbose)
+    
+    # With recent msgspec and orjson installed, an array whose type was sniffed is split into raw items
+    # and posted without parsing the items at all
+    if (sniffed_type and sniffed_type == data_type and item_prefix and item_prefix.endswith("item")
+            and RAW_ITEMS_SUPPORTED and WIRE_FORMAT == "json"):
+        try:
+            items = load_raw_items(args.json_file, item_prefix)
+        except ValueError as e:
+            print(f"Error: Invalid JSON file: {e}")
+            return 1
+        return post_batches(items, data_type, args.batch_size, args.max_threads, progress_path,
+                            args.resume, args.verbose)
+    
     # Read JSON file
     try:
-        with open(args.json_file, 'r') as f:
-            data = json.load(f)
+        data = load_json_file(args.json_file)
     except json.JSONDecodeError as e:
         print(f"Error: Invalid JSON file: {e}")
         return 1
@@ -216,8 +689,7 @@ def main():
         print(f"Error reading file: {e}")
         return 1
     
-    # Determine type
-    data_type = args.type
+    # Fall back to detecting the type from the parsed data
     if not data_type:
         data_type = detect_type(data)
         if not data_type:
@@ -228,46 +700,22 @@ def main():
     
     # Extract the actual list
     if data_type == "nodes":
-        items = data
         # Handle nested structures: {"nodes": [...]} or {"nodes": {"nodes": [...]}}
-        while isinstance(items, dict) and "nodes" in items:
-            items = items["nodes"]
+        items = data.get("nodes", data) if isinstance(data, dict) else data
+        items = items.get("nodes", items) if isinstance(items, dict) else items
         
-        # If still not a list, wrap it
+        # A single node is posted as a one-item list
         if not isinstance(items, list):
             items = [items] if items else []
-        
-        # Ensure items is a list
-        if not isinstance(items, list):
-            print(f"Error: Expected a list of nodes, got {type(items)}")
-            return 1
-        
-        try:
-            result = post_nodes(INDYKITE_TOKEN, items)
-            print(f"\nSuccessfully posted {len(items)} nodes")
-            print(f"Response: {json.dumps(result, indent=2)}")
-            return 0
-        except Exception as e:
-            print(f"\nError posting nodes: {e}")
-            return 1
     
     elif data_type == "relationships":
-        # Send data as-is (could be wrapped {"relationships": [...]} or array [...])
-        try:
-            result = post_relationships(INDYKITE_TOKEN, data)
-            # Determine count for success message
-            if isinstance(data, dict) and "relationships" in data:
-                count = len(data["relationships"])
-            elif isinstance(data, list):
-                count = len(data)
-            else:
-                count = 1
-            print(f"\nSuccessfully posted {count} relationships")
-            print(f"Response: {json.dumps(result, indent=2)}")
-            return 0
-        except Exception as e:
-            print(f"\nError posting relationships: {e}")
-            return 1
+        # Accept wrapped {"relationships": [...]}, a bare array, or a single relationship
+        items = data["relationships"] if isinstance(data, dict) and "relationships" in data else data
+        if not isinstance(items, list):
+            items = [items]
+    
+    return post_batches(items, data_type, args.batch_size, args.max_threads, progress_path,
+                        args.resume, args.verbose)
 
 
 if __name__ == "__main__":